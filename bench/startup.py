@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+
+# Budget for the imports RIPL itself adds on top of a bare interpreter, in microseconds.
+# Medians of 6-10ms have been measured, so this leaves room for noisy machines.
+BUDGET_US = 20000
+
+RUNS = 9
+
+ROOT   = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "ripl", "ripl.py")
+SOURCE = os.path.join(ROOT, "examples", "summing.ripl")
+
+# Installed programs start from cached bytecode, so make sure it is written
+ENV = dict(os.environ)
+ENV.pop("PYTHONDONTWRITEBYTECODE", None)
+
+def import_times(args):
+    result = subprocess.run([sys.executable, "-X", "importtime"] + args,
+                            stdout = subprocess.DEVNULL, stderr = subprocess.PIPE,
+                            universal_newlines = True, env = ENV)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+
+        # Only top level imports, as nested ones are included in their parent's cumulative time
+        if not name.startswith("  "):
+            times[name.strip()] = int(cumulative_us)
+
+    return times
+
+def startup_time():
+    interpreter = import_times(["-c", "pass"])
+    ripl        = import_times([SCRIPT, SOURCE])
+
+    added = {name: us for name, us in ripl.items() if name not in interpreter}
+    return sum(added.values()), added
+
+def main():
+    # The first run compiles the sources, so it isn't counted
+    startup_time()
+
+    samples = [startup_time() for run in range(RUNS)]
+    total, added = sorted(samples, key = lambda sample: sample[0])[RUNS // 2]
+
+    for name, us in sorted(added.items(), key = lambda item: -item[1]):
+        print("{:<24} {:>8} us".format(name, us))
+
+    print("{:<24} {:>8} us (median of {} runs, budget {} us)".format("total", total, RUNS, BUDGET_US))
+
+    if total > BUDGET_US:
+        print("Start up time is over budget.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import math
+
+import output
+import parser
+
+from tokeniser import TokenType
+from linker import collect_points
+from optimiser import walk, fold_constant
+
+# The model assumes a Brainfuck-like target: one cell per tape position, a head
+# moved one cell per instruction, and cells only changed by increment or decrement.
+# Values that are only known at runtime are assumed to be TYPICAL_VALUE.
+TYPICAL_VALUE     = 16
+LOOP_TRIP_COUNT   = 10
+HOTSPOT_COUNT     = 10
+
+RELATIONAL = (TokenType.LESS, TokenType.GREATER, TokenType.EQUAL, TokenType.NOT_EQUAL,
+              TokenType.LESS_OR_EQUAL, TokenType.GREATER_OR_EQUAL)
+
+def constant_cost(value):
+    # Either a run of increments or a multiplication loop like `++++[>++++<-]>`
+    value = abs(value)
+    if value < 16:
+        return value
+    root = math.isqrt(value)
+    return min(value, 2 * root + (value - root * root) + 6)
+
+def multiply_cost(constant):
+    if constant is None:
+        # Nested loops adding one operand to the result once per unit of the other
+        return 30, 4 * TYPICAL_VALUE * TYPICAL_VALUE + 8 * TYPICAL_VALUE
+    if constant in (0, 1):
+        return 0, 0
+    # A single loop like `[->+++<]`, synthesising the constant in its body, which
+    # for small constants is an unrolled chain of increments
+    body = constant_cost(constant)
+    return body + 6, TYPICAL_VALUE * (body + 4)
+
+def divide_cost(constant):
+    if constant is None:
+        # Generic divmod, which recopies the divisor each time it is used up
+        return 60, 24 * TYPICAL_VALUE
+    if constant == 1:
+        return 0, 0
+    # Divmod with the divisor reset to a constant instead of recopied
+    body = constant_cost(constant)
+    return 40 + body, 10 * TYPICAL_VALUE + (TYPICAL_VALUE // abs(constant)) * body
+
+class Cost:
+    def __init__(self, instructions = 0, steps = 0):
+        self.instructions = instructions
+        self.steps        = steps
+
+    def add(self, instructions, steps, weight = 1):
+        self.instructions += instructions
+        self.steps        += steps * weight
+
+class CostModel:
+    def __init__(self, unit):
+        self.unit  = unit
+        self.raw   = unit.pipeline_input
+
+        try:
+            self.trips = int(self.raw.options.get("trips", LOOP_TRIP_COUNT))
+        except ValueError:
+            output.error("Cost", "Loop trip count must be an integer.")
+            raise output.Abort()
+
+        # Tape cell of each point, indexed by symbol id
+        symbols           = unit.tokenised_repr.symbols
+        defined, imported = collect_points(unit.tokenised_repr)
+        self.cells = [0] * len(symbols)
+        position   = 0
+        for name, symbol in list(defined.items()) + list(imported.items()):
+            self.cells[symbols.idents[name]] = position
+            position += symbol.size
+
+    def line_weights(self):
+        # Lines inside a `loop` block run once per iteration of every enclosing loop,
+        # as do those of a `with:` block, which runs before every test of the loop after it
+        weights   = {}
+        loops     = []
+        loop_rows = []
+
+        lines = []
+        for token in self.unit.tokenised_repr:
+            if token.token_type is TokenType.RETURN:
+                lines.append([])
+            elif lines:
+                lines[-1].append(token)
+
+        heads = []
+        for line in lines:
+            depth = 0
+            while depth < len(line) and line[depth].token_type is TokenType.INDENT:
+                depth += 1
+
+            if depth == len(line) or line[depth].token_type is TokenType.EOF:
+                continue
+
+            heads.append((depth, line[depth]))
+
+        def is_block(head, name):
+            return head.token_type is TokenType.NAME and head.value == name
+
+        for position, (depth, head) in enumerate(heads):
+            while loops and loops[-1] >= depth:
+                loops.pop()
+
+            if is_block(head, "loop"):
+                loops.append(depth)
+                loop_rows.append(head.row_number)
+
+            elif is_block(head, "with"):
+                following = next((heads[after] for after in range(position + 1, len(heads))
+                                  if heads[after][0] <= depth), None)
+                if following is not None and following[0] == depth and is_block(following[1], "loop"):
+                    loops.append(depth)
+
+            weights[head.row_number] = self.trips ** len(loops)
+
+        return weights, loop_rows
+
+    def node_cost(self, node):
+        label = node.label
+        t     = label.token.token_type
+
+        if type(label) is parser.LiteralLabel:
+            if t is TokenType.INTEGER:
+                cost = constant_cost(label.token.value)
+                return cost, cost
+            if t is TokenType.CHAR:
+                cost = sum(constant_cost(ord(char)) for char in label.token.value)
+                return cost, cost
+            if t is TokenType.STRING:
+                cost = sum(constant_cost(ord(char)) + 1 for char in label.token.value)
+                return cost, cost
+            return 1, 1
+
+        if type(label) is parser.NameLabel:
+            # Moving to the point and back again
+            distance = self.cells[label.symbol]
+            return 2 * distance, 2 * distance
+
+        if type(label) is parser.PointAccessLabel:
+            # Non-destructive copy through a temporary cell
+            return 20, 12 * TYPICAL_VALUE
+
+        if type(label) is parser.AssignmentLabel:
+            # Clearing the destination with `[-]` before moving the value in
+            return 12, 8 * TYPICAL_VALUE
+
+        if type(label) is parser.OperatorLabel:
+            if t in (TokenType.PLUS, TokenType.MINUS):
+                return 8, 6 * TYPICAL_VALUE
+            if t in RELATIONAL:
+                return 40, 20 * TYPICAL_VALUE
+            if t in (TokenType.STAR, TokenType.SLASH):
+                return self.product_cost(node)
+            return 0, 0
+
+        if type(label) is parser.StructureOffsetLabel:
+            resolution = getattr(label, "resolution", None)
+            if resolution is not None and resolution.static:
+                return resolution.index, resolution.index
+            # Walking a marker along the structure, one cell per step of the index
+            return 40, 14 * TYPICAL_VALUE
+
+        if type(label) is parser.ProcedureLabel:
+            return 2, 2
+
+        if type(label) is parser.StructureLabel:
+            return 2, 2
+
+        return 0, 0
+
+    def product_cost(self, node):
+        if len(node.children) != 2:
+            return 0, 0
+
+        left, right = (fold_constant(child) for child in node.children)
+        if left is not None and right is not None:
+            # Folded at compile time, leaving only the constant
+            return 0, 0
+
+        if node.label.token.token_type is TokenType.STAR:
+            constant = left if left is not None else right
+            cost     = multiply_cost(constant)
+            generic  = multiply_cost(None)
+        else:
+            # Division by 0 is rejected by the VM, so it isn't priced as a reduction
+            constant = right if right != 0 else None
+            cost     = divide_cost(constant)
+            generic  = divide_cost(None)
+
+        if constant is not None:
+            self.reductions.append((node.label.token, constant, cost, generic))
+        return cost
+
+    def estimate(self):
+        weights, loop_rows = self.line_weights()
+        costs = {}
+
+        self.reductions = []
+
+        for node in walk(self.unit.abstract_repr.root):
+            if not isinstance(node.label, parser.TokenLabel):
+                continue
+
+            row = node.label.token.row_number
+            instructions, steps = self.node_cost(node)
+            costs.setdefault(row, Cost()).add(instructions, steps, weights.get(row, 1))
+
+        # Loop control is a `[` and `]` per iteration
+        for row in loop_rows:
+            costs.setdefault(row, Cost()).add(2, 2, weights[row])
+
+        return costs
+
+    def generate(self):
+        costs = self.estimate()
+
+        output.info("Cost", "Estimated cost of \"{0}\", assuming {1} iterations per loop".format(self.raw.file_name, self.trips))
+        output.info("Cost", "{:>6} {:>10} {:>12}  {}".format("Line", "Instrs", "Steps", "Source"))
+
+        hotspots = sorted(costs.items(), key = lambda item: (-item[1].steps, item[0]))[:HOTSPOT_COUNT]
+        for row, cost in hotspots:
+            output.info("Cost", "{:>6} {:>10} {:>12}  {}".format(row, cost.instructions, cost.steps,
+                                                                  self.raw.get_line(row).line.strip()))
+
+        output.info("Cost", "{:>6} {:>10} {:>12}".format("Total",
+                                                        sum(cost.instructions for cost in costs.values()),
+                                                        sum(cost.steps for cost in costs.values())))
+
+        if self.raw.verbose:
+            for token, constant, cost, generic in self.reductions:
+                output.info("Cost", "{op} by {constant} at {row}, {col}: {steps} steps against {generic} for the generic loop".format(
+                            op       = "Multiplication" if token.token_type is TokenType.STAR else "Division",
+                            constant = constant,
+                            row      = token.row_number,
+                            col      = token.col_number,
+                            steps    = cost[1],
+                            generic  = generic[1]))
+
+        self.unit.costs = costs
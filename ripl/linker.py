@@ -0,0 +1,232 @@
+import os
+
+import output
+
+from tokeniser import TokenType
+
+CACHE_DIR     = ".ripl_cache"
+CACHE_MAGIC   = b"ripl-object"
+
+# Stages whose code decides what goes into an object; objects written by any other
+# version of them are not reused
+COMPILER_MODULES = ("tokeniser", "parser", "optimiser", "linker")
+
+class PointSymbol:
+    def __init__(self, name, size, row_number, col_number):
+        self.name       = name
+        self.size       = size
+        self.row_number = row_number
+        self.col_number = col_number
+
+class ObjectArtefact:
+    def __init__(self, unit_name, file_name, source_hash, tokenised_repr, abstract_repr, exports, imports):
+        self.unit_name      = unit_name
+        self.file_name      = file_name
+        self.source_hash    = source_hash
+
+        self.tokenised_repr = tokenised_repr
+        self.abstract_repr  = abstract_repr
+
+        # Points defined by this unit and points it accesses without defining
+        self.exports        = exports
+        self.imports        = imports
+
+    def cells(self):
+        return sum(symbol.size for symbol in self.exports.values())
+
+# hashlib and pickle are only needed for the object cache, so are imported on use
+
+def source_hash(source_file):
+    import hashlib
+
+    digest = hashlib.sha1()
+    for source_line in source_file:
+        digest.update(source_line.line.encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+# Hash of the compiler modules, worked out once per run
+compiler_digest = None
+
+def compiler_hash():
+    import hashlib
+
+    global compiler_digest
+    if compiler_digest is None:
+        digest    = hashlib.sha1()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for module in COMPILER_MODULES:
+            with open(os.path.join(directory, module + ".py"), "rb") as modulef:
+                digest.update(modulef.read())
+        compiler_digest = digest.hexdigest()
+    return compiler_digest
+
+def cache_header(digest):
+    return b" ".join((CACHE_MAGIC, compiler_hash().encode("ascii"), digest.encode("ascii"))) + b"\n"
+
+def cache_path(file_name):
+    directory, base_name = os.path.split(os.path.abspath(file_name))
+    return os.path.join(directory, CACHE_DIR, base_name + ".o")
+
+# Objects are pickled, so loading one from an untrusted cache directory would
+# otherwise be able to run arbitrary code. The header is checked before anything
+# is unpickled, and unpickling can only create the compiler's own classes, but
+# a cache directory should still only be shared with people you trust.
+
+def object_unpickler(cachef):
+    import pickle
+
+    class ObjectUnpickler(pickle.Unpickler):
+        def find_class(self, module, name):
+            if module in COMPILER_MODULES:
+                found = getattr(__import__(module), name, None)
+                if isinstance(found, type) and found.__module__ == module:
+                    return found
+            raise pickle.UnpicklingError("\"{0}.{1}\" is not allowed in an object".format(module, name))
+
+    return ObjectUnpickler(cachef)
+
+def load_artefact(source_file):
+    import pickle
+
+    try:
+        with open(cache_path(source_file.file_name), "rb") as cachef:
+            if cachef.readline() != cache_header(source_hash(source_file)):
+                return None
+            artefact = object_unpickler(cachef).load()
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError, RecursionError):
+        return None
+
+    if type(artefact) is not ObjectArtefact:
+        return None
+
+    return artefact
+
+def store_artefact(artefact):
+    import pickle
+
+    # Written under a temporary name first, so a failed write never leaves a partial object
+    path      = cache_path(artefact.file_name)
+    temp_path = "{0}.{1}.tmp".format(path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        with open(temp_path, "wb") as cachef:
+            cachef.write(cache_header(artefact.source_hash))
+            pickle.dump(artefact, cachef, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    except (OSError, RecursionError, pickle.PicklingError):
+        output.warning("Linker", "Could not write object file \"" + path + "\"")
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+def struct_size(tokens, index):
+    # Size of the literal starting at tokens[index], or 1 for anything that isn't a structure
+    token = tokens[index]
+    if token.token_type is TokenType.STRING:
+        return max(len(token.value), 1)
+
+    if token.token_type is TokenType.LBRACE:
+        size  = 1
+        depth = 0
+        for token in (tokens[position] for position in range(index, len(tokens))):
+            if token.token_type in (TokenType.LBRACE, TokenType.LPAREN):
+                depth += 1
+            elif token.token_type in (TokenType.RBRACE, TokenType.RPAREN):
+                depth -= 1
+                if depth == 0:
+                    break
+            elif token.token_type is TokenType.COMMA and depth == 1:
+                size += 1
+        return size
+
+    return 1
+
+def collect_points(tokenised_repr):
+    tokens  = tokenised_repr.tokens
+    symbols = tokenised_repr.symbols
+
+    # Cells needed by each symbol and where it is first defined, indexed by symbol id
+    sizes     = [0] * len(symbols)
+    positions = [None] * len(symbols)
+
+    for index, token in enumerate(tokens):
+        if token.token_type is not TokenType.NAME:
+            continue
+
+        symbol = symbols[token.symbol]
+        if symbol.definition is None or index == 0 or \
+           tokens[index - 1].token_type not in (TokenType.RETURN, TokenType.INDENT, TokenType.COLON):
+            continue
+
+        # A point is defined by a statement of the form `x ! ...` or `x.n ! ...`
+        size = 1
+        rest = tokens[index + 1:index + 4]
+        if len(rest) >= 3 and rest[0].token_type is TokenType.DOT and rest[1].token_type is TokenType.INTEGER \
+                          and rest[2].token_type is TokenType.BANG:
+            size = rest[1].value + 1
+        elif rest and rest[0].token_type is TokenType.BANG:
+            if len(rest) > 1:
+                size = struct_size(tokens, index + 2)
+        else:
+            continue
+
+        sizes[token.symbol] = max(sizes[token.symbol], size)
+        if positions[token.symbol] is None:
+            positions[token.symbol] = (token.row_number, token.col_number)
+
+    defined = {}
+    imports = {}
+    for symbol in sorted(symbols, key = lambda symbol: positions[symbol.ident] or (0, 0)):
+        if sizes[symbol.ident]:
+            defined[symbol.name] = PointSymbol(symbol.name, sizes[symbol.ident], *positions[symbol.ident])
+        elif symbol.use is not None:
+            imports[symbol.name] = PointSymbol(symbol.name, 1, *symbol.use)
+
+    return defined, imports
+
+def compile_artefact(unit):
+    exports, imports = collect_points(unit.tokenised_repr)
+    digest           = source_hash(unit.pipeline_input) if unit.pipeline_input.cached else None
+    return ObjectArtefact(unit.unit_name, unit.pipeline_input.file_name, digest,
+                          unit.tokenised_repr, unit.abstract_repr, exports, imports)
+
+class LinkedProgram:
+    def __init__(self, artefacts, positions, sizes, cells):
+        self.artefacts = artefacts
+        self.positions = positions
+        self.sizes     = sizes
+        self.cells     = cells
+
+class Linker:
+    def __init__(self, artefacts, verbose = False):
+        self.artefacts = artefacts
+        self.verbose   = verbose
+
+    def link(self):
+        # Points are global, so every unit that defines a point shares its cells
+        sizes = {}
+        for artefact in self.artefacts:
+            for name, symbol in artefact.exports.items():
+                sizes[name] = max(sizes.get(name, 0), symbol.size)
+
+        for artefact in self.artefacts:
+            for name, symbol in artefact.imports.items():
+                if name not in sizes:
+                    output.warning("Linker", "Point \"{0}\" accessed at {1}, {2} in \"{3}\" is never defined."
+                                             .format(name, symbol.row_number, symbol.col_number, artefact.file_name))
+                    sizes[name] = symbol.size
+
+        positions = {}
+        cell      = 0
+        for name, size in sizes.items():
+            positions[name] = cell
+            cell += size
+
+        if self.verbose:
+            for name, position in positions.items():
+                output.info("Linker", "{name:<10} at cell {pos:<6} size {size}".format(name = name, pos = position,
+                                                                                   size = sizes[name]))
+
+        return LinkedProgram(self.artefacts, positions, sizes, cell)
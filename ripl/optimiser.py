@@ -0,0 +1,155 @@
+import operator
+
+import output
+import parser
+
+from tokeniser import TokenType
+from linker import collect_points
+
+FOLDING_OPERATORS = {
+    TokenType.PLUS  : operator.add,
+    TokenType.MINUS : operator.sub,
+    TokenType.STAR  : operator.mul,
+    TokenType.SLASH : operator.floordiv,
+}
+
+def walk(root):
+    # Nodes can have several parents, so each is only visited once
+    seen  = set()
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node in seen:
+            continue
+        seen.add(node)
+
+        yield node
+        stack.extend(reversed(node.children))
+
+def scope_of(node):
+    return next((child for child in node.children if type(child.label) is parser.ScopeLabel), None)
+
+def statement_roots(scope_node):
+    return [child for child in scope_node.children if child.parent.get() is scope_node]
+
+def fold_constant(node):
+    label = node.label
+
+    if type(label) is parser.LiteralLabel:
+        token = label.token
+        if   token.token_type is TokenType.INTEGER:
+            return token.value
+        elif token.token_type is TokenType.CHAR and len(token.value) == 1:
+            return ord(token.value)
+        elif token.token_type is TokenType.TRUE:
+            return 1
+        elif token.token_type is TokenType.FALSE:
+            return 0
+
+    elif type(label) is parser.ExpressionLabel:
+        scope = scope_of(node)
+        if scope is not None:
+            return fold_chain(statement_roots(scope))
+
+    return None
+
+def fold_chain(roots):
+    if len(roots) == 1 and type(roots[0].label) is not parser.OperatorLabel:
+        return fold_constant(roots[0])
+
+    # The parser leaves a run of operators as siblings which share their operands,
+    # so `1 + 2 * 3` is PLUS(1, 2) followed by STAR(2, 3)
+    values    = []
+    operators = []
+    previous  = None
+    for root in roots:
+        if type(root.label) is not parser.OperatorLabel or len(root.children) != 2:
+            return None
+
+        if root.label.token.token_type not in FOLDING_OPERATORS:
+            return None
+
+        left, right = root.children
+        if previous is None:
+            values.append(fold_constant(left))
+        elif left is not previous:
+            return None
+
+        operators.append(root.label)
+        values.append(fold_constant(right))
+        previous = right
+
+    if not operators or None in values:
+        return None
+
+    try:
+        return evaluate(values, operators)
+    except ZeroDivisionError:
+        return None
+
+def evaluate(values, operators):
+    def apply():
+        right = pending_values.pop()
+        left  = pending_values.pop()
+        fold  = FOLDING_OPERATORS[pending_operators.pop().token.token_type]
+        pending_values.append(fold(left, right))
+
+    pending_values    = [values[0]]
+    pending_operators = []
+    for label, value in zip(operators, values[1:]):
+        while pending_operators and pending_operators[-1].precedence >= label.precedence:
+            apply()
+        pending_operators.append(label)
+        pending_values.append(value)
+
+    while pending_operators:
+        apply()
+
+    return pending_values[0]
+
+class OffsetResolution:
+    def __init__(self, struct_name, index, size):
+        self.struct_name = struct_name
+        self.size        = size
+
+        # A static offset is a fixed cell; a dynamic one needs an indexed walk at runtime
+        self.index       = index
+        self.static      = index is not None
+
+class Optimiser:
+    def __init__(self, unit):
+        self.unit = unit
+
+    def resolve_offsets(self):
+        defined, imported = collect_points(self.unit.tokenised_repr)
+        raw = self.unit.pipeline_input
+
+        offsets = [node for node in walk(self.unit.abstract_repr.root)
+                   if type(node.label) is parser.StructureOffsetLabel and len(node.children) == 2]
+        offsets.sort(key = lambda node: (node.label.token.row_number, node.label.token.col_number))
+
+        for node in offsets:
+            struct, index = node.children
+            token = node.label.token
+
+            struct_name = struct.label.token.value if type(struct.label) is parser.NameLabel else None
+            size        = defined[struct_name].size if struct_name in defined else None
+
+            resolution = OffsetResolution(struct_name, fold_constant(index), size)
+            node.label.resolution = resolution
+
+            if resolution.static and (resolution.index < 0 or (size is not None and resolution.index >= size)):
+                raw.log_warning("Optimiser", token.row_number, token.col_number,
+                                "Offset {0} is outside of structure \"{1}\" of size {2}.".format(resolution.index, struct_name, size))
+
+            if raw.verbose:
+                output.info("Optimiser", "Offset into {name:<10} at {row}, {col} is {kind}".format(
+                            name = str(struct_name),
+                            row  = token.row_number,
+                            col  = token.col_number,
+                            kind = "static, index {0}".format(resolution.index) if resolution.static else "dynamic"))
+
+        self.unit.offsets = [node.label.resolution for node in offsets]
+
+    def generate(self):
+        self.resolve_offsets()
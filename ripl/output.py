@@ -1,20 +1,44 @@
-import logging
+import sys
 
-logging.basicConfig(level=logging.INFO, format="%(message)s")
-logger = logging.getLogger("ripl-main")
+# The logging module is only loaded for verbose runs; otherwise messages are
+# written straight to stderr in the same format.
+logger = None
+
+INFO    = 20
+WARNING = 30
+ERROR   = 40
+
+def enable_logging():
+    global logger
+    import logging
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    logger = logging.getLogger("ripl-main")
+
+def log(level, message):
+    if logger is None:
+        sys.stderr.write(message + "\n")
+    else:
+        logger.log(level, message)
 
 
 def raw_info(message):
-    logger.info(message)
+    log(INFO, message)
 
 def info(stage, message):
-    logger.info("[{0}] {1}".format(stage, message))
+    log(INFO, "[{0}] {1}".format(stage, message))
+
+def info_lines(stage, lines):
+    # Long dumps are written as they are generated, skipping the per message
+    # overhead of logging, whose format is only the message itself
+    prefix = "[{0}] ".format(stage)
+    sys.stderr.writelines(prefix + line + "\n" for line in lines)
 
 def warning(stage, message):
-    logger.warning("[{0}] Warning: {1}".format(stage, message))
+    log(WARNING, "[{0}] Warning: {1}".format(stage, message))
 
 def error(stage, message):
-    logger.error("[{0}] Error: {1}".format(stage, message))
+    log(ERROR, "[{0}] Error: {1}".format(stage, message))
 
 
 class Abort(Exception):
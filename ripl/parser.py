@@ -1,9 +1,9 @@
 from tokeniser import TokenType
 from collections import deque
 from enum import Enum
+import itertools
 import output
-import names
-import random
+import sys
 
 class Priority:
     def __init__(self, lp, ln, rp, rn):
@@ -90,6 +90,24 @@ class PointAccessLabel(TokenLabel):
 class OperatorLabel(TokenLabel):
     priority = Priority.step(PointAccessLabel.priority)
 
+    # Operators in a run bind by precedence, highest first, so `1 + 2 * 3` is 7
+    precedences = {
+        TokenType.STAR             : 3,
+        TokenType.SLASH            : 3,
+        TokenType.PLUS             : 2,
+        TokenType.MINUS            : 2,
+        TokenType.LESS             : 1,
+        TokenType.GREATER          : 1,
+        TokenType.EQUAL            : 1,
+        TokenType.NOT_EQUAL        : 1,
+        TokenType.LESS_OR_EQUAL    : 1,
+        TokenType.GREATER_OR_EQUAL : 1,
+    }
+
+    @property
+    def precedence(self):
+        return self.precedences.get(self.token.token_type, 0)
+
 # Procedures - like `@output`
 class ProcedureLabel(TokenLabel):
     priority = Priority.step(OperatorLabel.priority).highest_left().nullify_right()
@@ -102,6 +120,10 @@ class AssignmentLabel(TokenLabel):
 class NameLabel(TokenLabel):
     priority = Priority.highest()
 
+    @property
+    def symbol(self):
+        return self.token.symbol
+
 # Literal - like `"hello"` or `2`
 class LiteralLabel(TokenLabel):
     priority = Priority.highest()
@@ -137,12 +159,14 @@ class TrackingList(list):
             raise IndexError
         super().append(item)
 
+node_counter = itertools.count()
+
 class Node:
     def __init__(self, parent, children):
         self.parent    = parent
         self.children  = TrackingList(self, children)
         self.label     = None
-        self.ident     = names.get_first_name() + str(random.randint(0,100))
+        self.ident     = "node" + str(next(node_counter))
 
     def set_label(self, label):
         self.label = label
@@ -183,28 +207,98 @@ class Node:
             parent.add_child(node)
         return node
 
+    def describe(self):
+        return "-> {}: [{} : {}]".format(self.ident,
+                                         str(self.label.token.value)
+                                         if hasattr(self.label, "token") and self.label.token.value != "" else
+                                         type(self.label).__name__,
+                                         str(self.label.token.token_type.name)
+                                         if hasattr(self.label, "token") else
+                                         "")
+
+    def walk(self, lvl = 0):
+        # Iterative so that deep nesting can't reach the recursion limit. As in the
+        # dump, a node with several parents is visited once under each of them.
+        stack = [(self, lvl)]
+        while stack:
+            node, depth = stack.pop()
+            yield node, depth
+
+            children = node.children
+            if type(node.label) is ScopeLabel:
+                children = [child for child in children if child.parent.get() is not None]
+            stack.extend((child, depth + 1) for child in reversed(children))
+
     def traverse(self, lvl):
-        t_list = [(lvl * "    ") + "-> {}: [{} : {}]"
-                                   .format(self.ident,
-                                           str(self.label.token.value)
-                                           if hasattr(self.label, "token") and self.label.token.value is not "" else
-                                           type(self.label).__name__,
-                                           str(self.label.token.token_type.name)
-                                           if hasattr(self.label, "token") else
-                                           "")]
-        for child in self.children:
-            if type(self.label) is ScopeLabel:
-                if child.parent.get() is None:
-                    continue
-            t_list += child.traverse(lvl + 1)
-        return t_list
+        return [(depth * "    ") + node.describe() for node, depth in self.walk(lvl)]
 
 class SyntaxTree:
     def __init__(self):
         self.root = Node.root().set_label(ScopeLabel())
 
+    def lines(self):
+        return ((depth * "    ") + node.describe() for node, depth in self.root.walk())
+
+    def dump(self, stream):
+        for line in self.lines():
+            stream.write(line + "\n")
+
+    def export(self, stream, file_name):
+        # json is only needed for exports, so is imported on use
+        import json
+
+        # Compact JSON on a single line. Nodes are numbered in the order they are
+        # written, and children refer to these numbers, so a node with several
+        # parents appears once.
+        numbers = {self.root: 0}
+        pending = deque([self.root])
+
+        stream.write("{\"file\":" + json.dumps(file_name) + ",\"nodes\":[")
+        while pending:
+            node = pending.popleft()
+            for child in node.children:
+                if child not in numbers:
+                    numbers[child] = len(numbers)
+                    pending.append(child)
+
+            record = {"label": type(node.label).__name__}
+            if hasattr(node.label, "token"):
+                token = node.label.token
+                record["type"]  = token.token_type.name
+                record["value"] = token.value
+                record["row"]   = token.row_number
+                record["col"]   = token.col_number
+            record["children"] = [numbers[child] for child in node.children]
+
+            stream.write(("," if numbers[node] else "") + json.dumps(record, separators = (",", ":")))
+        stream.write("]}\n")
+
     def __str__(self):
-        return "\n".join(self.root.traverse(0))
+        return "\n".join(self.lines())
+
+# Files written by `-tree=path` so far; later units in the same run append to them
+written_trees = set()
+
+def write_tree(tree, file_name, path):
+    # A path ending in .json gets the JSON export, anything else the text dump
+    if path == "-":
+        stream = sys.stdout
+    else:
+        try:
+            stream = open(path, "a" if path in written_trees else "w")
+        except OSError:
+            output.warning("Parser", "Could not write tree to \"" + path + "\"")
+            return
+    written_trees.add(path)
+
+    if path.endswith(".json"):
+        tree.export(stream, file_name)
+    else:
+        stream.write("# " + file_name + "\n")
+        tree.dump(stream)
+
+    if stream is not sys.stdout:
+        stream.close()
 
 class TokenTape:
     def __init__(self, tokenised_repr):
@@ -426,6 +520,12 @@ class Parser:
         self.tree   = SyntaxTree()
         self.tokens = TokenTape(self.unit.tokenised_repr)
         self.parse()
-        if self.unit.pipeline_input.verbose:
-            for line in str(self.tree).split("\n"):
-                output.info("Parser", line)
+
+        self.unit.abstract_repr = self.tree
+
+        raw = self.unit.pipeline_input
+        if raw.verbose:
+            output.info_lines("Parser", self.tree.lines())
+
+        if "tree" in raw.options:
+            write_tree(self.tree, raw.file_name, raw.options["tree"])
@@ -2,10 +2,6 @@ import time
 
 import output
 
-import tokeniser
-import parser
-import optimiser
-
 class Unit:
     def __init__(self, unit_name, pipeline_input):
         self.unit_name       = unit_name
@@ -14,6 +10,9 @@ class Unit:
         self.tokenised_repr  = None
         self.abstract_repr   = None
 
+        self.offsets         = None
+        self.costs           = None
+
 
 class Pipeline:
     def __init__(self, pipeline_input):
@@ -23,5 +22,59 @@ class Pipeline:
         self.unit = Unit(unit_name, pipeline_input)
 
     def begin(self):
+        # Stage modules are imported as their stage runs to keep start up fast
+        import tokeniser
         tokeniser .Tokeniser(self.unit) .generate()
+
+        import parser
         parser    .Parser(self.unit)    .generate()
+
+        self.analyse()
+
+    def analyse(self):
+        import optimiser
+        optimiser .Optimiser(self.unit) .generate()
+
+        if self.unit.pipeline_input.estimate:
+            import costmodel
+            costmodel .CostModel(self.unit) .generate()
+
+    def compile(self):
+        import linker
+
+        if self.unit.pipeline_input.cached:
+            artefact = linker.load_artefact(self.unit.pipeline_input)
+            if artefact is not None:
+                if self.unit.pipeline_input.verbose:
+                    output.info("Linker", "Using cached object for \"{0}\"".format(artefact.file_name))
+
+                # The cached trees are only reanalysed for the reports they produce
+                if self.unit.pipeline_input.verbose or self.unit.pipeline_input.estimate:
+                    self.unit.tokenised_repr = artefact.tokenised_repr
+                    self.unit.abstract_repr  = artefact.abstract_repr
+                    self.analyse()
+
+                raw = self.unit.pipeline_input
+                if "tree" in raw.options:
+                    import parser
+                    parser.write_tree(artefact.abstract_repr, raw.file_name, raw.options["tree"])
+
+                return artefact
+
+        self.begin()
+        artefact = linker.compile_artefact(self.unit)
+
+        if self.unit.pipeline_input.cached:
+            linker.store_artefact(artefact)
+
+        return artefact
+
+def link(pipeline_inputs):
+    artefacts = [Pipeline(pipeline_input).compile() for pipeline_input in pipeline_inputs]
+
+    import linker
+    return linker.Linker(artefacts, verbose = any(i.verbose for i in pipeline_inputs)).link()
+
+def run(program, pipeline_inputs):
+    import vm
+    return vm.run(program, pipeline_inputs)
@@ -10,16 +10,21 @@ class SourceLine:
         self.line = line
 
 class SourceFile:
-    def __init__(self, file_name, raw_lines, raw_flags):
+    def __init__(self, file_name, raw_lines, raw_flags, options = None):
         self.file_name = file_name
 
         self.lines = []
         for row_number, line in enumerate(raw_lines, start = 1):
             self.lines.append(SourceLine(row_number, line))
 
-        self.verbose = "v" in raw_flags
+        self.verbose  = "v" in raw_flags
+        self.parallel = "p" in raw_flags
+        self.cached   = "c" in raw_flags
+        self.estimate = "e" in raw_flags
+        self.run      = "r" in raw_flags
 
-        self.flags = raw_flags
+        self.flags   = raw_flags
+        self.options = options if options is not None else {}
 
 
     def __iter__(self):
@@ -46,42 +51,58 @@ class SourceFile:
         output.raw_info("\n".join(self.get_traceback(row_number, col_number)))
 
 class Command:
-    def __init__(self, args, flags):
+    def __init__(self, args, flags, options):
         self.args = args
         self.flags = flags
+        self.options = options
 
 def get_command(supplied):
-    args = supplied[1:]
+    args = []
     flags = set()
-    for arg in args:
-        if arg[0] is "-":
-            flags.update(list(arg[1:]))
-            args.remove(arg)
+    options = {}
+    for arg in supplied[1:]:
+        if arg[0] == "-":
+            # Options take a value, like `-trips=20`; anything else is a set of flags
+            if "=" in arg:
+                name, value = arg[1:].split("=", 1)
+                options[name] = value
+            else:
+                flags.update(list(arg[1:]))
+        else:
+            args.append(arg)
+
+    return Command(args, flags, options)
+
+def read_source(source_path, command):
+    try:
+        with open(source_path) as sourcef:
+            lines = list(line.strip("\n") for line in sourcef)
+            return SourceFile(source_path, lines, command.flags, command.options)
 
-    return Command(args, flags)
+    except FileNotFoundError:
+        output.error("Init", "Could not find source file \"" + source_path + "\"")
+        raise output.Abort()
 
 def initialise():
     command = get_command(sys.argv)
 
     if command.args:
-        source_path = command.args[0]
+        source_files = [read_source(source_path, command) for source_path in command.args]
 
-        try:
-            with open(source_path) as sourcef:
-                lines = list(line.strip("\n") for line in sourcef)
-                return SourceFile(source_path, lines, command.flags)
+        if source_files[0].verbose:
+            output.enable_logging()
 
-        except FileNotFoundError:
-            output.error("Init", "Could not find source file \"" + source_path + "\"")
-            raise output.Abort()
+        return source_files
     else:
         output.error("Init","Please specify a source file.")
         raise output.Abort()
 
 if __name__ == "__main__":
     try:
-        pipeline_input = initialise()
-        pipeline.Pipeline(pipeline_input).begin()
+        pipeline_inputs = initialise()
+        program = pipeline.link(pipeline_inputs)
+
+        if pipeline_inputs[0].run:
+            sys.exit(pipeline.run(program, pipeline_inputs))
     except output.Abort:
         sys.exit(1)
-
@@ -26,6 +26,8 @@ class TokenType(Enum):
 
     PLUS     = 30
     MINUS    = 31
+    STAR     = 32
+    SLASH    = 33
 
     LESS             = 40
     GREATER          = 41
@@ -58,6 +60,9 @@ class Token:
         self.col_number = col_number
         self.value      = value
 
+        # Index into the unit's SymbolTable, for NAME tokens only
+        self.symbol     = None
+
         self.char       = ""
 
     def __str__(self):
@@ -70,9 +75,50 @@ class Token:
 
 
 
+class Symbol:
+    def __init__(self, ident, name):
+        self.ident      = ident
+        self.name       = name
+
+        # (row, col) of the first `name ! ...` and the first `&name`, for diagnostics
+        self.definition = None
+        self.use        = None
+
+    def __str__(self):
+        return "{ident:<5} {name:<10} defined at {definition:<10} used at {use}".format(
+               ident      = self.ident,
+               name       = self.name,
+               definition = "{0}, {1}".format(*self.definition) if self.definition else "-",
+               use        = "{0}, {1}".format(*self.use) if self.use else "-"
+               )
+
+class SymbolTable:
+    def __init__(self):
+        self.symbols = []
+        self.idents  = {}
+
+    def intern(self, name):
+        ident = self.idents.get(name)
+        if ident is None:
+            ident = len(self.symbols)
+            self.idents[name] = ident
+            self.symbols.append(Symbol(ident, name))
+        return ident
+
+    def __getitem__(self, ident):
+        return self.symbols[ident]
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __iter__(self):
+        for symbol in self.symbols:
+            yield symbol
+
 class TokenisedRepresentation():
     def __init__(self):
-        self.tokens = []
+        self.tokens  = []
+        self.symbols = SymbolTable()
 
     def add_token(self, token):
         self.tokens.append(token)
@@ -151,6 +197,10 @@ class Tokeniser():
                     token = Token(TokenType.PLUS, row_number, col_number)
                 elif char == "-":
                     token = Token(TokenType.MINUS, row_number, col_number)
+                elif char == "*":
+                    token = Token(TokenType.STAR, row_number, col_number)
+                elif char == "/":
+                    token = Token(TokenType.SLASH, row_number, col_number)
                 elif char == ":":
                     token = Token(TokenType.COLON, row_number, col_number)
                 elif char == "(":
@@ -170,7 +220,7 @@ class Tokeniser():
         self.add_token(token)
         self.tokenise(row_number, col_number + 1, line[1:], force_plain = force_plain)
 
-    def bundle_tokens(self):
+    def indent_tokens(self):
         lines = []
         line  = []
         for token in self.tokenised_repr:
@@ -209,8 +259,12 @@ class Tokeniser():
                 if index in indent_levels[1:]:
                     line[index] = Token(TokenType.INDENT, token.row_number, token.col_number)
 
-        tokens = [token for line in lines for token in line]
+        return [token for line in lines for token in line]
 
+    def bundle_tokens(self):
+        self.bundle_chain(self.indent_tokens())
+
+    def bundle_chain(self, tokens):
         def breaks_name(token):
             if type(token) is Token:
                 return True
@@ -323,23 +377,152 @@ class Tokeniser():
         pure_repr.filter_proto_tokens()
         self.tokenised_repr = pure_repr
 
+    def generate_parallel(self):
+        from concurrent.futures import ProcessPoolExecutor
+        import os
+
+        raw = self.unit.pipeline_input
+        try:
+            count = int(raw.options.get("chunks", os.cpu_count() or 1))
+        except ValueError:
+            output.error("Tokeniser", "Chunk count must be an integer.")
+            raise output.Abort()
+
+        chunks = split_chunks(raw, max(count, 1))
+
+        # Each chunk ends with the token that follows it in the serial stream, so
+        # that names, strings and errors are terminated exactly as they would be
+        end_tokens = [Token(TokenType.RETURN, chunk[0][0], 0) for chunk in chunks[1:]]
+        end_tokens.append(Token(TokenType.EOF, chunks[-1][-1][0], -1))
+
+        with ProcessPoolExecutor() as pool:
+            results = list(pool.map(tokenise_chunk, chunks, end_tokens))
+
+        # Serial tokenisation checks indentation across the whole file before bundling,
+        # so report the first error of the earliest phase
+        errors = [error for tokens, error in results if error is not None]
+        if errors:
+            phase, stage, row_number, col_number, message = min(errors, key = lambda error: error[0])
+            raw.log_error(stage, row_number, col_number, message)
+
+        for index, (tokens, error) in enumerate(results):
+            # Drop the RETURN borrowed from the next chunk, which tokenises it itself
+            if index < len(results) - 1:
+                tokens = tokens[:-1]
+
+            for token in tokens:
+                self.add_token(token)
+
+    def intern_symbols(self):
+        tokens  = self.tokenised_repr.tokens
+        symbols = self.tokenised_repr.symbols
+
+        for index, token in enumerate(tokens):
+            if token.token_type is not TokenType.NAME:
+                continue
+
+            token.symbol = symbols.intern(token.value)
+            symbol       = symbols[token.symbol]
+
+            prev_type = tokens[index - 1].token_type if index > 0 else TokenType.RETURN
+            next_type = tokens[index + 1].token_type if index + 1 < len(tokens) else TokenType.EOF
+
+            if prev_type is TokenType.AMPER:
+                if symbol.use is None:
+                    symbol.use = (token.row_number, token.col_number)
+
+            elif prev_type in (TokenType.RETURN, TokenType.INDENT, TokenType.COLON) \
+                 and next_type in (TokenType.BANG, TokenType.DOT):
+                if symbol.definition is None:
+                    symbol.definition = (token.row_number, token.col_number)
+
     def generate(self):
         raw = self.unit.pipeline_input
 
-        # First we generate the simple tokens
-        for source_line in raw:
-            line = source_line.line
-            self.tokenise(source_line.row_number, 1, line)
+        if raw.parallel:
+            self.generate_parallel()
+
+        else:
+            # First we generate the simple tokens
+            for source_line in raw:
+                line = source_line.line
+                self.tokenise(source_line.row_number, 1, line)
 
-        self.add_token(Token(TokenType.EOF, source_line.row_number, -1))
+            self.add_token(Token(TokenType.EOF, source_line.row_number, -1))
 
-        # Now we take the ProtoTokens and create the more complex ones.
-        self.bundle_tokens()
+            # Now we take the ProtoTokens and create the more complex ones.
+            self.bundle_tokens()
+
+        self.intern_symbols()
 
         self.unit.tokenised_repr = self.tokenised_repr
 
         if self.unit.pipeline_input.verbose:
-            for token in self.unit.tokenised_repr:
-                output.info("Tokeniser", str(token))
+            output.info_lines("Tokeniser", (str(token) for token in self.unit.tokenised_repr))
+            output.info_lines("Tokeniser", ("Symbol " + str(symbol) for symbol in self.unit.tokenised_repr.symbols))
+
+
+
+
+# Phases of bundle_tokens, used to order errors from chunks in the same way
+# that serial tokenisation would encounter them
+PHASE_INDENT = 0
+PHASE_BUNDLE = 1
 
+class ChunkAbort(Exception):
+    def __init__(self, phase, stage, row_number, col_number, message):
+        super().__init__(phase, stage, row_number, col_number, message)
 
+class ChunkInput:
+    # Stands in for the SourceFile in a worker process. Errors are passed back to
+    # the parent, which holds the source lines needed to print a traceback.
+    def __init__(self):
+        self.verbose  = False
+        self.parallel = False
+        self.phase    = PHASE_INDENT
+
+    def log_error(self, stage, row_number, col_number, message):
+        raise ChunkAbort(self.phase, stage, row_number, col_number, message)
+
+class ChunkUnit:
+    def __init__(self):
+        self.pipeline_input = ChunkInput()
+
+def split_chunks(source_file, count):
+    rows   = [(source_line.row_number, source_line.line) for source_line in source_file]
+    target = sum(len(line) + 1 for row_number, line in rows) // count + 1
+
+    chunks = [[]]
+    size   = 0
+    for row_number, line in rows:
+        # A line with no indentation resets the indentation stack to [0], so
+        # tokenisation can restart there with no state carried over. Escaped
+        # spaces count as indentation too, so lines starting with `\` are never
+        # split before. Quotes are closed at the end of every line, so no line
+        # starts inside a string.
+        if size >= target and not line.startswith((" ", "\\")):
+            chunks.append([])
+            size = 0
+
+        chunks[-1].append((row_number, line))
+        size += len(line) + 1
+
+    return chunks
+
+def tokenise_chunk(rows, end_token):
+    unit      = ChunkUnit()
+    tokeniser = Tokeniser(unit)
+
+    for row_number, line in rows:
+        tokeniser.tokenise(row_number, 1, line)
+
+    tokeniser.add_token(end_token)
+
+    try:
+        tokens = tokeniser.indent_tokens()
+        unit.pipeline_input.phase = PHASE_BUNDLE
+        tokeniser.bundle_chain(tokens)
+    except ChunkAbort as abort:
+        return None, abort.args
+
+    return tokeniser.tokenised_repr.tokens, None
@@ -0,0 +1,776 @@
+from array import array
+import operator
+import sys
+
+import output
+import parser
+
+from tokeniser import TokenType
+from optimiser import scope_of
+
+# Every instruction is an opcode followed by a single operand
+PUSH          = 0
+POP           = 1
+LOAD          = 2
+STORE         = 3
+LOAD_INDEXED  = 4
+STORE_INDEXED = 5
+
+ADD           = 10
+SUB           = 11
+MUL           = 12
+DIV           = 13
+
+LESS             = 20
+GREATER          = 21
+EQUAL            = 22
+NOT_EQUAL        = 23
+LESS_OR_EQUAL    = 24
+GREATER_OR_EQUAL = 25
+
+OUTPUT        = 30
+OUTPUT_CHAR   = 31
+INPUT         = 32
+
+JUMP          = 40
+JUMP_FALSE    = 41
+
+EXIT          = 50
+HALT          = 51
+
+OPCODE_NAMES = {value: name for name, value in globals().items() if name.isupper() and type(value) is int}
+
+ARITHMETIC = {
+    ADD              : operator.add,
+    SUB              : operator.sub,
+    MUL              : operator.mul,
+    DIV              : operator.floordiv,
+    LESS             : lambda left, right: int(left < right),
+    GREATER          : lambda left, right: int(left > right),
+    EQUAL            : lambda left, right: int(left == right),
+    NOT_EQUAL        : lambda left, right: int(left != right),
+    LESS_OR_EQUAL    : lambda left, right: int(left <= right),
+    GREATER_OR_EQUAL : lambda left, right: int(left >= right),
+}
+
+# Most instructions a loop may grow to when unrolled, unless set with `-unroll=N`
+UNROLL_BUDGET     = 256
+
+# Instructions simulated to find a loop's trip count before giving up on it
+UNROLL_STEP_LIMIT = 100000
+
+OPERAND_MIN = -2 ** 63
+OPERAND_MAX =  2 ** 63 - 1
+
+BINARY_OPCODES = {
+    TokenType.PLUS             : ADD,
+    TokenType.MINUS            : SUB,
+    TokenType.STAR             : MUL,
+    TokenType.SLASH            : DIV,
+    TokenType.LESS             : LESS,
+    TokenType.GREATER          : GREATER,
+    TokenType.EQUAL            : EQUAL,
+    TokenType.NOT_EQUAL        : NOT_EQUAL,
+    TokenType.LESS_OR_EQUAL    : LESS_OR_EQUAL,
+    TokenType.GREATER_OR_EQUAL : GREATER_OR_EQUAL,
+}
+
+# Binding power of each kind of infix node; higher binds tighter.
+# Operators bind at BIND_OPERATOR plus their precedence.
+BIND_NONE       = 0
+BIND_ASSIGN     = 10
+BIND_OPERATOR   = 20
+BIND_ACCESS     = 50
+BIND_OFFSET     = 60
+
+# Labels which can begin an operand
+OPERAND_LABELS = (parser.LiteralLabel, parser.NameLabel, parser.ExpressionLabel, parser.StructureLabel,
+                  parser.PointAccessLabel, parser.ProcedureLabel)
+
+class Expr:
+    def __init__(self, kind, node, *args):
+        self.kind = kind
+        self.node = node
+        self.args = args
+
+class Cursor:
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.pos   = 0
+        self.last  = nodes[0] if nodes else None
+
+    def peek(self):
+        return self.nodes[self.pos] if self.pos < len(self.nodes) else None
+
+    def next(self):
+        node = self.peek()
+        if node is not None:
+            self.pos += 1
+            self.last = node
+        return node
+
+def statements(scope):
+    # The parser leaves every node of a scope as a child of it in source order,
+    # so the statements of a block are its children grouped by row
+    groups = []
+    row    = None
+    for child in scope.children:
+        if not isinstance(child.label, parser.TokenLabel):
+            continue
+        if child.label.token.row_number != row:
+            row = child.label.token.row_number
+            groups.append([])
+        groups[-1].append(child)
+    return groups
+
+class Evaluation:
+    def __init__(self):
+        self.complete      = False
+        self.steps         = 0
+        self.iterations    = 0
+        self.side_effects  = False
+        self.unknown_store = False
+
+def partial_evaluate(code, start, end, known, limits, step_limit):
+    # Runs code[start:end] using the cell values known at compile time, updating
+    # known in place. None stands for a value that is only known at runtime.
+    evaluation = Evaluation()
+    stack      = []
+
+    pc = start
+    while pc != end:
+        if evaluation.steps == step_limit:
+            return evaluation
+
+        opcode  = code[pc]
+        operand = code[pc + 1]
+        pc += 2
+        evaluation.steps += 1
+
+        if   opcode == PUSH:
+            stack.append(operand)
+        elif opcode == POP:
+            stack.pop()
+        elif opcode == LOAD:
+            stack.append(known.get(operand))
+        elif opcode in (STORE, STORE_INDEXED):
+            cell = operand
+            if opcode == STORE_INDEXED:
+                index = stack.pop()
+                if index is None:
+                    stack.pop()
+                    for cell in range(operand, operand + limits[operand]):
+                        known.pop(cell, None)
+                    evaluation.unknown_store = True
+                    continue
+                if not 0 <= index < limits[operand]:
+                    return evaluation
+                cell = operand + index
+
+            value = stack.pop()
+            if value is None:
+                known.pop(cell, None)
+                evaluation.unknown_store = True
+            else:
+                known[cell] = value
+        elif opcode == LOAD_INDEXED:
+            index = stack.pop()
+            if index is None:
+                stack.append(None)
+            elif not 0 <= index < limits[operand]:
+                return evaluation
+            else:
+                stack.append(known.get(operand + index))
+        elif opcode in ARITHMETIC:
+            right = stack.pop()
+            left  = stack.pop()
+            if left is None or right is None:
+                stack.append(None)
+            elif opcode == DIV and right == 0:
+                return evaluation
+            else:
+                stack.append(ARITHMETIC[opcode](left, right))
+        elif opcode in (OUTPUT, OUTPUT_CHAR):
+            stack.pop()
+            evaluation.side_effects = True
+        elif opcode == INPUT:
+            stack.append(None)
+            evaluation.side_effects = True
+        elif opcode == JUMP_FALSE:
+            value = stack.pop()
+            if value is None:
+                return evaluation
+            if value <= 0:
+                pc = operand
+        elif opcode == JUMP:
+            if operand == start:
+                evaluation.iterations += 1
+            pc = operand
+        else:
+            return evaluation
+
+    evaluation.complete = True
+    return evaluation
+
+class LoopReport:
+    def __init__(self, row_number, trips, action, size_before, size_after, steps_before, steps_after):
+        self.row_number   = row_number
+        self.trips        = trips
+        self.action       = action
+        self.size_before  = size_before
+        self.size_after   = size_after
+        self.steps_before = steps_before
+        self.steps_after  = steps_after
+
+    def __str__(self):
+        return "Loop at line {row}: {trips} iterations, {action}; size {sb} -> {sa}, steps {tb} -> {ta}".format(
+               row    = self.row_number,
+               trips  = self.trips,
+               action = self.action,
+               sb     = self.size_before,
+               sa     = self.size_after,
+               tb     = self.steps_before,
+               ta     = self.steps_after
+               )
+
+class Compiler:
+    def __init__(self, program, budget = UNROLL_BUDGET):
+        self.program = program
+        self.code    = array("q")
+        self.rows    = array("l")
+
+        # Values of cells known at compile time at the current top level statement;
+        # cells missing from it are only known at runtime. Every cell starts at 0.
+        self.known   = dict.fromkeys(range(program.cells), 0)
+        self.depth   = 0
+        self.budget  = budget
+        self.reports = []
+
+        # Size of the point starting at each cell, for bounds checks on indexed access
+        self.limits = [0] * program.cells
+        for name, position in program.positions.items():
+            self.limits[position] = program.sizes[name]
+
+    def error(self, node, message):
+        token = node.label.token
+        self.raw.log_error("VM", token.row_number, token.col_number, message)
+
+    def emit(self, opcode, operand, node):
+        return self.emit_raw(opcode, operand, node.label.token.row_number if node is not None else 0)
+
+    def emit_raw(self, opcode, operand, row_number):
+        self.code.append(opcode)
+        self.code.append(operand)
+        self.rows.append(row_number)
+        return len(self.code) - 2
+
+    def segment(self, begin, end):
+        return [(self.code[pc], self.code[pc + 1], self.rows[pc // 2]) for pc in range(begin, end, 2)]
+
+    def truncate(self, start):
+        del self.code[start:]
+        del self.rows[start // 2:]
+
+    # Parsing
+
+    def binding(self, node):
+        label = node.label
+        if type(label) is parser.OperatorLabel:
+            return BIND_OPERATOR + label.precedence if label.precedence else BIND_NONE
+        if type(label) is parser.StructureOffsetLabel:
+            return BIND_OFFSET
+        if type(label) is parser.AssignmentLabel:
+            return BIND_ASSIGN
+        return BIND_NONE
+
+    def expression(self, cursor, rbp):
+        node = cursor.next()
+        if node is None:
+            self.error(cursor.last, "Expected an operand.")
+
+        left = self.prefix(cursor, node)
+        while cursor.peek() is not None and self.binding(cursor.peek()) > rbp:
+            node = cursor.next()
+            left = self.infix(cursor, node, left)
+        return left
+
+    def parse_all(self, nodes, owner):
+        if not nodes:
+            self.error(owner, "Expected an expression.")
+
+        cursor = Cursor(nodes)
+        expr   = self.expression(cursor, BIND_NONE)
+        if cursor.peek() is not None:
+            self.error(cursor.peek(), "Unexpected token in expression.")
+        return expr
+
+    def prefix(self, cursor, node):
+        label = node.label
+        token = label.token
+        t     = token.token_type
+
+        if type(label) is parser.LiteralLabel:
+            if t is TokenType.INTEGER:
+                if not OPERAND_MIN <= token.value <= OPERAND_MAX:
+                    self.error(node, "Integer literal does not fit in 64 bits.")
+                return Expr("int", node, token.value)
+            if t is TokenType.CHAR:
+                if len(token.value) != 1:
+                    self.error(node, "Character literal must be a single character.")
+                return Expr("int", node, ord(token.value))
+            if t is TokenType.TRUE:
+                return Expr("int", node, 1)
+            if t is TokenType.FALSE:
+                return Expr("int", node, 0)
+            if t is TokenType.STRING:
+                return Expr("struct", node, [Expr("int", node, ord(char)) for char in token.value])
+
+        elif type(label) is parser.NameLabel:
+            return Expr("name", node)
+
+        elif type(label) is parser.ExpressionLabel:
+            return self.parse_all(scope_of(node).children, node)
+
+        elif type(label) is parser.StructureLabel:
+            cursor   = Cursor(scope_of(node).children)
+            elements = []
+            while cursor.peek() is not None:
+                elements.append(self.expression(cursor, BIND_NONE))
+                separator = cursor.next()
+                if separator is not None and separator.label.token.token_type is not TokenType.COMMA:
+                    self.error(separator, "Expected a comma between structure elements.")
+            return Expr("struct", node, elements)
+
+        elif type(label) is parser.PointAccessLabel:
+            target = self.expression(cursor, BIND_ACCESS)
+            if target.kind not in ("name", "offset"):
+                self.error(node, "Only points can be accessed.")
+            return Expr("load", node, target)
+
+        elif type(label) is parser.ProcedureLabel:
+            names = [child for child in scope_of(node).children if type(child.label) is parser.NameLabel]
+            if not names:
+                self.error(node, "Expected a procedure name.")
+
+            argument = None
+            if cursor.peek() is not None and isinstance(cursor.peek().label, OPERAND_LABELS):
+                argument = self.expression(cursor, BIND_ASSIGN)
+            return Expr("procedure", node, names[0].label.token.value, argument)
+
+        self.error(node, "Unexpected token in expression.")
+
+    def infix(self, cursor, node, left):
+        label = node.label
+
+        if type(label) is parser.OperatorLabel:
+            right = self.expression(cursor, self.binding(node))
+            return Expr("binary", node, BINARY_OPCODES[label.token.token_type], left, right)
+
+        if type(label) is parser.StructureOffsetLabel:
+            if left.kind != "name":
+                self.error(node, "Only points can be offset.")
+            return Expr("offset", node, left, self.expression(cursor, BIND_OFFSET))
+
+        if type(label) is parser.AssignmentLabel:
+            if left.kind not in ("name", "offset"):
+                self.error(node, "Only points can be assigned to.")
+            value = self.expression(cursor, BIND_ASSIGN - 1) if cursor.peek() is not None else None
+            return Expr("assign", node, left, value)
+
+    # Code generation
+
+    def point(self, name):
+        symbol = name.node.label.token.value
+        if symbol not in self.program.positions:
+            self.error(name.node, "Point \"{0}\" is never defined.".format(symbol))
+        return self.program.positions[symbol], self.program.sizes[symbol]
+
+    def static_index(self, offset):
+        # The optimiser has already folded every offset it can to a fixed index
+        name, index = offset.args
+        position, size = self.point(name)
+        resolution = getattr(offset.node.label, "resolution", None)
+        if resolution is None or not resolution.static:
+            return None
+        if not 0 <= resolution.index < size:
+            self.error(offset.node, "Offset {0} is outside of structure \"{1}\" of size {2}."
+                                    .format(resolution.index, name.node.label.token.value, size))
+        return position + resolution.index
+
+    def compile_value(self, expr):
+        kind = expr.kind
+
+        if kind == "int":
+            self.emit(PUSH, expr.args[0], expr.node)
+
+        elif kind == "load":
+            target = expr.args[0]
+            if target.kind == "name":
+                self.emit(LOAD, self.point(target)[0], expr.node)
+            else:
+                cell = self.static_index(target)
+                if cell is not None:
+                    self.emit(LOAD, cell, expr.node)
+                else:
+                    self.compile_value(target.args[1])
+                    self.emit(LOAD_INDEXED, self.point(target.args[0])[0], target.node)
+
+        elif kind == "binary":
+            opcode, left, right = expr.args
+            if opcode == DIV and right.kind == "int" and right.args[0] == 0:
+                self.error(expr.node, "Division by zero.")
+            self.compile_value(left)
+            self.compile_value(right)
+            self.emit(opcode, 0, expr.node)
+
+        elif kind == "procedure" and expr.args[0] == "input":
+            self.emit(INPUT, 0, expr.node)
+
+        elif kind == "procedure":
+            self.error(expr.node, "Procedure \"{0}\" does not give a value.".format(expr.args[0]))
+
+        elif kind in ("name", "offset"):
+            self.error(expr.node, "Points must be accessed with & to use their value.")
+
+        elif kind == "struct":
+            self.error(expr.node, "Structures can only be assigned to points.")
+
+        elif kind == "assign":
+            self.error(expr.node, "Assignment does not give a value.")
+
+    def compile_assign(self, expr):
+        target, value = expr.args
+
+        if value is not None and value.kind == "struct":
+            if target.kind != "name":
+                self.error(expr.node, "Structures can only be assigned to points.")
+            position, size = self.point(target)
+            for index, element in enumerate(value.args[0]):
+                self.compile_value(element)
+                self.emit(STORE, position + index, element.node)
+            return
+
+        if value is None:
+            self.emit(PUSH, 0, expr.node)
+        else:
+            self.compile_value(value)
+
+        if target.kind == "name":
+            self.emit(STORE, self.point(target)[0], expr.node)
+        else:
+            cell = self.static_index(target)
+            if cell is not None:
+                self.emit(STORE, cell, expr.node)
+            else:
+                self.compile_value(target.args[1])
+                self.emit(STORE_INDEXED, self.point(target.args[0])[0], target.node)
+
+    def compile_procedure(self, expr):
+        name, argument = expr.args
+
+        if name == "output":
+            if argument is None:
+                self.error(expr.node, "Procedure \"output\" needs a value.")
+            if argument.kind == "struct":
+                for element in argument.args[0]:
+                    self.compile_value(element)
+                    self.emit(OUTPUT_CHAR, 0, expr.node)
+            else:
+                self.compile_value(argument)
+                self.emit(OUTPUT, 0, expr.node)
+
+        elif name == "input":
+            self.emit(INPUT, 0, expr.node)
+            self.emit(POP, 0, expr.node)
+
+        elif name == "exit":
+            if argument is None:
+                self.emit(PUSH, 0, expr.node)
+            else:
+                self.compile_value(argument)
+            self.emit(EXIT, 0, expr.node)
+
+        else:
+            self.error(expr.node, "Unknown procedure \"{0}\".".format(name))
+
+    def compile_statement(self, group):
+        expr = self.parse_all(group, group[0])
+
+        if expr.kind == "assign":
+            self.compile_assign(expr)
+        elif expr.kind == "procedure":
+            self.compile_procedure(expr)
+        else:
+            self.compile_value(expr)
+            self.emit(POP, 0, expr.node)
+
+    def compile_loop(self, prelude, header):
+        # `with:` runs before every test of the `loop` condition that follows it
+        self.depth += 1
+
+        start = len(self.code)
+        if prelude is not None:
+            self.compile_block(scope_of(prelude))
+
+        condition = len(self.code)
+        self.compile_value(self.parse_all(header[1:-1], header[0]))
+        jump = self.emit(JUMP_FALSE, 0, header[0])
+
+        body = len(self.code)
+        self.compile_block(scope_of(header[-1]))
+        back = self.emit(JUMP, start, header[0])
+        self.code[jump + 1] = len(self.code)
+
+        self.depth -= 1
+
+        if self.depth == 0:
+            self.optimise_loop(start, condition, jump, body, back, header[0].label.token.row_number)
+
+    # Loop unrolling
+
+    def forget(self, start):
+        # Drop what is known about any cell the code from start may change
+        for pc in range(start, len(self.code), 2):
+            if self.code[pc] == STORE:
+                self.known.pop(self.code[pc + 1], None)
+            elif self.code[pc] == STORE_INDEXED:
+                self.known = {}
+                return
+
+    def propagate(self, start):
+        evaluation = partial_evaluate(self.code, start, len(self.code), self.known, self.limits, UNROLL_STEP_LIMIT)
+        if not evaluation.complete:
+            self.known = {}
+
+    def optimise_loop(self, start, condition, jump, body, back, row_number):
+        # With no budget the loop is left as compiled, though what it stores is forgotten
+        if self.budget == 0:
+            self.forget(start)
+            return
+
+        end        = len(self.code)
+        known      = dict(self.known)
+        evaluation = partial_evaluate(self.code, start, end, known, self.limits, UNROLL_STEP_LIMIT)
+
+        if not evaluation.complete:
+            self.forget(start)
+            return
+
+        trips = evaluation.iterations
+        size  = (end - start) // 2
+
+        # With no side effects and every value known, the loop is replaced by its result
+        changed = sorted(cell for cell, value in known.items() if self.known.get(cell) != value)
+        if not evaluation.side_effects and not evaluation.unknown_store and 2 * len(changed) <= self.budget and \
+           all(OPERAND_MIN <= known[cell] <= OPERAND_MAX for cell in changed):
+            self.truncate(start)
+            for cell in changed:
+                self.emit_raw(PUSH, known[cell], row_number)
+                self.emit_raw(STORE, cell, row_number)
+
+            self.known = known
+            self.reports.append(LoopReport(row_number, trips, "evaluated", size, 2 * len(changed),
+                                           evaluation.steps, 2 * len(changed)))
+            return
+
+        self.known = known
+
+        prelude_code   = self.segment(start, condition)
+        condition_code = self.segment(condition, jump)
+        body_code      = self.segment(body, back)
+
+        # Nested loops would need their jumps relocating, so are left alone
+        if any(opcode in (JUMP, JUMP_FALSE) for opcode, operand, row in prelude_code + body_code):
+            return
+
+        full_size = trips * (len(prelude_code) + len(body_code)) + len(prelude_code)
+        if full_size <= self.budget:
+            self.truncate(start)
+            for iteration in range(trips):
+                for instruction in prelude_code + body_code:
+                    self.emit_raw(*instruction)
+            for instruction in prelude_code:
+                self.emit_raw(*instruction)
+
+            self.reports.append(LoopReport(row_number, trips, "fully unrolled", size, full_size,
+                                           evaluation.steps, full_size))
+            return
+
+        # Otherwise repeat the body as many times as fit, testing the condition once
+        # per repeat; the factor divides the trip count so the test is never skipped
+        test_size = len(prelude_code) + len(condition_code) + 1
+        for factor in range(trips // 2, 1, -1):
+            partial_size = test_size + factor * len(body_code) + (factor - 1) * len(prelude_code) + 1
+            if trips % factor == 0 and partial_size <= self.budget:
+                break
+        else:
+            return
+
+        self.truncate(start)
+        for instruction in prelude_code + condition_code:
+            self.emit_raw(*instruction)
+        exit_jump = self.emit_raw(JUMP_FALSE, 0, row_number)
+        for repeat in range(factor):
+            if repeat:
+                for instruction in prelude_code:
+                    self.emit_raw(*instruction)
+            for instruction in body_code:
+                self.emit_raw(*instruction)
+        self.emit_raw(JUMP, start, row_number)
+        self.code[exit_jump + 1] = len(self.code)
+
+        self.reports.append(LoopReport(row_number, trips, "unrolled by {0}".format(factor), size, partial_size,
+                                       evaluation.steps, (trips // factor) * partial_size + test_size))
+
+    def compile_block(self, scope):
+        groups = statements(scope)
+        index  = 0
+        while index < len(groups):
+            group = groups[index]
+            index += 1
+
+            if type(group[-1].label) is not parser.CodeBlockLabel:
+                start = len(self.code)
+                self.compile_statement(group)
+                if self.depth == 0:
+                    self.propagate(start)
+                continue
+
+            keyword = group[0].label.token.value if type(group[0].label) is parser.NameLabel else None
+            if keyword == "loop":
+                self.compile_loop(None, group)
+
+            elif keyword == "with" and len(group) == 2:
+                if index == len(groups) or groups[index][0].label.token.value != "loop":
+                    self.error(group[0], "Expected a loop after \"with\" block.")
+                self.compile_loop(group[-1], groups[index])
+                index += 1
+
+            else:
+                self.error(group[0], "Unknown block.")
+
+    def compile_unit(self, artefact, source_file):
+        self.raw = source_file
+        self.compile_block(artefact.abstract_repr.root)
+
+    def finish(self):
+        self.emit(HALT, 0, None)
+
+def execute(code, rows, limits, cells):
+    stack = []
+    push  = stack.append
+    pop   = stack.pop
+    write = sys.stdout.write
+
+    pc = 0
+    while True:
+        opcode  = code[pc]
+        operand = code[pc + 1]
+        pc += 2
+
+        if   opcode == LOAD:
+            push(cells[operand])
+        elif opcode == PUSH:
+            push(operand)
+        elif opcode == STORE:
+            cells[operand] = pop()
+        elif opcode == ADD:
+            right = pop()
+            stack[-1] += right
+        elif opcode == SUB:
+            right = pop()
+            stack[-1] -= right
+        elif opcode == MUL:
+            right = pop()
+            stack[-1] *= right
+        elif opcode == DIV:
+            right = pop()
+            if right == 0:
+                return runtime_error(rows, pc, "Division by zero.")
+            stack[-1] //= right
+        elif opcode == JUMP_FALSE:
+            if pop() <= 0:
+                pc = operand
+        elif opcode == JUMP:
+            pc = operand
+        elif opcode == LESS:
+            right = pop()
+            stack[-1] = 1 if stack[-1] < right else 0
+        elif opcode == GREATER:
+            right = pop()
+            stack[-1] = 1 if stack[-1] > right else 0
+        elif opcode == EQUAL:
+            right = pop()
+            stack[-1] = 1 if stack[-1] == right else 0
+        elif opcode == NOT_EQUAL:
+            right = pop()
+            stack[-1] = 1 if stack[-1] != right else 0
+        elif opcode == LESS_OR_EQUAL:
+            right = pop()
+            stack[-1] = 1 if stack[-1] <= right else 0
+        elif opcode == GREATER_OR_EQUAL:
+            right = pop()
+            stack[-1] = 1 if stack[-1] >= right else 0
+        elif opcode == LOAD_INDEXED:
+            index = pop()
+            if not 0 <= index < limits[operand]:
+                return runtime_error(rows, pc, "Offset {0} is outside of structure of size {1}.".format(index, limits[operand]))
+            push(cells[operand + index])
+        elif opcode == STORE_INDEXED:
+            index = pop()
+            if not 0 <= index < limits[operand]:
+                return runtime_error(rows, pc, "Offset {0} is outside of structure of size {1}.".format(index, limits[operand]))
+            cells[operand + index] = pop()
+        elif opcode == POP:
+            pop()
+        elif opcode == OUTPUT:
+            write(str(pop()) + "\n")
+        elif opcode == OUTPUT_CHAR:
+            value = pop()
+            # Surrogates can't be written out on their own, so aren't characters either
+            if not 0 <= value < 0x110000 or 0xD800 <= value < 0xE000:
+                return runtime_error(rows, pc, "Value {0} is not a character.".format(value))
+            write(chr(value))
+        elif opcode == INPUT:
+            char = sys.stdin.read(1)
+            push(ord(char) if char else 0)
+        elif opcode == EXIT:
+            return pop()
+        elif opcode == HALT:
+            return 0
+
+def runtime_error(rows, pc, message):
+    output.error("VM", "{0} At line {1}.".format(message, rows[pc // 2 - 1]))
+    raise output.Abort()
+
+def disassemble(code):
+    for pc in range(0, len(code), 2):
+        yield "{pc:>6} {name:<18} {operand}".format(pc = pc, name = OPCODE_NAMES[code[pc]], operand = code[pc + 1])
+
+def run(program, source_files):
+    try:
+        budget = int(source_files[0].options.get("unroll", UNROLL_BUDGET))
+    except ValueError:
+        output.error("VM", "Unroll budget must be an integer.")
+        raise output.Abort()
+
+    # Expressions are compiled recursively, once per level of nesting
+    compiler = Compiler(program, budget)
+    try:
+        for artefact, source_file in zip(program.artefacts, source_files):
+            compiler.compile_unit(artefact, source_file)
+    except RecursionError:
+        output.error("VM", "Program is nested too deeply to compile.")
+        raise output.Abort()
+    compiler.finish()
+
+    if source_files[0].verbose:
+        for report in compiler.reports:
+            output.info("VM", str(report))
+
+        for line in disassemble(compiler.code):
+            output.info("VM", line)
+
+    status = execute(compiler.code, compiler.rows, compiler.limits, [0] * program.cells)
+    sys.stdout.flush()
+    return status
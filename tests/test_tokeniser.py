@@ -0,0 +1,66 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ripl"))
+
+import output
+import pipeline
+import ripl
+import tokeniser
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "examples")
+
+def tokenise(lines, flags, options = None):
+    # Tokens as comparable tuples, or the error printed if tokenisation aborts
+    source_file = ripl.SourceFile("test.ripl", lines, flags, options)
+    unit        = pipeline.Unit("test", source_file)
+    try:
+        tokeniser.Tokeniser(unit).generate()
+    except output.Abort:
+        return None
+
+    return [(token.token_type, token.row_number, token.col_number, token.value, token.symbol)
+            for token in unit.tokenised_repr]
+
+def assert_equivalent(lines, capsys, chunks = 8):
+    serial       = tokenise(lines, set())
+    serial_err   = capsys.readouterr().err
+    parallel     = tokenise(lines, {"p"}, {"chunks": str(chunks)})
+    parallel_err = capsys.readouterr().err
+
+    assert parallel == serial
+    assert parallel_err == serial_err
+    return serial
+
+def read_example(name):
+    with open(os.path.join(EXAMPLES, name)) as sourcef:
+        return [line.strip("\n") for line in sourcef]
+
+@pytest.mark.parametrize("name", ["summing.ripl", "struct.ripl", "precedence.ripl", "indentation.ripl"])
+def test_examples(name, capsys):
+    assert_equivalent(read_example(name) * 20, capsys)
+
+def test_chunk_boundaries(capsys):
+    lines = []
+    for index in range(40):
+        lines += ["x{0} ! {0}".format(index), "with:", "    y ! \"a b\"", "loop &y:", "    @output 'c'", ""]
+
+    assert assert_equivalent(lines, capsys) is not None
+
+def test_bad_dedent(capsys):
+    lines = ["a ! 1"] + ["  b ! 1"] * 50 + ["    c ! 1", "   d ! 1", "e ! 1"]
+
+    assert assert_equivalent(lines, capsys) is None
+
+def test_escaped_indentation(capsys):
+    # Escaped spaces are indentation, so a chunk must not start at this line
+    lines = ["a ! 1"] + ["  b ! 1"] * 50 + ["    c ! 1", "\\ \\ \\ d ! 1", "e ! 1"]
+
+    assert assert_equivalent(lines, capsys) is None
+
+def test_unterminated_string(capsys):
+    lines = ["a ! 1"] * 30 + ["b ! \"open"] + ["c ! 2"] * 30
+
+    assert assert_equivalent(lines, capsys) is None